@@ -3,11 +3,17 @@
 YouTube Stream Updater - URL Extractor (Fixed Global Scope)
 """
 
-import json
+import asyncio
+import contextvars
 import os
 import sys
 import argparse
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
+from typing import NamedTuple
 
 # --- GLOBAL DEĞİŞKENLER ---
 ENDPOINT = os.environ.get("ENDPOINT")
@@ -18,6 +24,27 @@ if not ENDPOINT:
 ENDPOINT = ENDPOINT.rstrip("/")
 FOLDER_NAME = "streams"
 TIMEOUT = 50
+# curl_cffi tarayıcı taklidi (ör. "chrome120"); boşsa standart TLS el sıkışması kullanılır.
+# Yalnızca httpx yokken devreye giren curl_cffi thread yolunu etkiler
+IMPERSONATE = os.environ.get("IMPERSONATE", "").strip()
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "text/plain, */*",
+    "Accept-Encoding": "gzip, br",
+    "Connection": "keep-alive"
+}
+M3U8_HEADER = (
+    b"#EXTM3U\n"
+    b"#EXT-X-VERSION:3\n"
+    b"#EXT-X-STREAM-INF:BANDWIDTH=1280000,RESOLUTION=1280x720\n"
+)
+CHUNK_SIZE = 8192
+FIRST_LINE_LIMIT = 65536
+CONCURRENCY = 10
+DISK_WORKERS = 8
+# Soğuk Worker ilk isteklerde 404 dönebiliyor; kısa aralıklarla tekrar denenir
+NOT_FOUND_RETRIES = 3
+NOT_FOUND_BACKOFF = 0.1
 
 # Session motoru seçimi
 try:
@@ -25,142 +52,382 @@ try:
     SESSION_TYPE = "curl_cffi"
 except ImportError:
     import requests
+    from requests.adapters import HTTPAdapter
     SESSION_TYPE = "requests"
 
-if SESSION_TYPE == "requests":
-    session = requests.Session()
-else:
-    session = None
+def create_session(pool_size=CONCURRENCY):
+    # Tek bir kalıcı session: keep-alive ve TLS oturumu tüm yayınlar arasında paylaşılır
+    if SESSION_TYPE == "curl_cffi":
+        return curl_requests.Session(impersonate=IMPERSONATE or None)
 
-def load_config(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    s = requests.Session()
+    # Havuz eşzamanlılıktan küçükse fazla bağlantılar her seferinde yeniden açılır
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size * 2,
+        max_retries=0
+    )
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
 
-def make_request(url, headers):
-    if SESSION_TYPE == "curl_cffi":
-        return curl_requests.get(
-            url,
-            headers=headers,
-            timeout=TIMEOUT,
-            impersonate="chrome120",
-            allow_redirects=True
-        )
+# requests.Session thread'ler arasında paylaşılabilir; curl_cffi Session paylaşılamaz,
+# bu yüzden her worker thread kendi curl_cffi session'ını açar.
+# requests session'ı main() içinde, yalnızca thread modu kullanılacaksa açılır
+session = None
+_local = threading.local()
+_thread_sessions = []
+_thread_sessions_lock = threading.Lock()
+
+def get_session():
+    if SESSION_TYPE == "requests":
+        return session
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = create_session()
+        with _thread_sessions_lock:
+            _thread_sessions.append(s)
+    return s
+
+def close_sessions():
+    global session
+    if session is not None:
+        session.close()
+        session = None
+    with _thread_sessions_lock:
+        while _thread_sessions:
+            _thread_sessions.pop().close()
+
+# JSON çözücü (orjson yoksa standart json)
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+# Async motoru (varsa tüm yayınlar eşzamanlı çekilir)
+# httpx + h2: tüm istekler Worker'a açılan tek HTTP/2 bağlantısı üzerinden akar
+try:
+    import httpx
+    import h2  # noqa: F401  (http2=True için gerekli)
+    ASYNC_TYPE = "httpx"
+except ImportError:
+    ASYNC_TYPE = None
+
+# Her yayının log satırları biriktirilir ve tek write() ile basılır; eşzamanlı
+# çalışan yayınların satırları da böylece birbirine karışmaz
+_log_buffer = contextvars.ContextVar("log_buffer", default=None)
+
+def log(msg):
+    buf = _log_buffer.get()
+    if buf is None:
+        sys.stdout.write(f"{msg}\n")
     else:
-        return session.get(
-            url,
-            headers=headers,
-            timeout=TIMEOUT,
-            allow_redirects=True
-        )
+        buf.append(msg)
+
+@contextmanager
+def stream_log():
+    buf = []
+    token = _log_buffer.set(buf)
+    try:
+        yield
+    finally:
+        _log_buffer.reset(token)
+        sys.stdout.write("\n".join(buf) + "\n")
+
+class Stream(NamedTuple):
+    id: str
+    slug: str
+    subfolder: str = ""
+
+def load_config(path):
+    # Dosyayı tek seferde bayt olarak oku; orjson ve json ikisi de bytes kabul eder
+    data = _json.loads(Path(path).read_bytes())
+    # Ham dict'ler bir kez Stream'e çevrilir; sonrasında yalnızca alan erişimi yapılır
+    return [Stream(d["id"], d["slug"], d.get("subfolder", "")) for d in data]
+
+# Gövde yalnızca requests'te akış olarak okunur. curl_cffi'de her stream=True
+# yanıtı ayrı bir transfer açar ve close() bağlantıyı kapatır; session'ın
+# keep-alive'ı boşa gider. Worker gövdesi tek kısa satır olduğundan orada
+# düz get() yeterli.
+STREAM_BODY = SESSION_TYPE == "requests"
+
+def make_request(url, headers, stream=False):
+    return get_session().get(
+        url,
+        headers=headers,
+        timeout=TIMEOUT,
+        allow_redirects=True,
+        stream=stream
+    )
+
+def first_line_buffer(buf, chunk):
+    # Baştaki boşluklar yalnızca ilk anlamlı bayt görülene kadar atılır;
+    # ilk satır tamamlandıysa (veya limit aşıldıysa) True döner
+    if not buf:
+        chunk = chunk.lstrip()
+    buf += chunk
+    return buf, b"\n" in chunk or len(buf) >= FIRST_LINE_LIMIT
+
+# Aynı ID'ye sahip yayınlar (farklı slug/subfolder) Worker'a yalnızca bir kez sorulur.
+# stream_id -> Future (thread modu) veya Task (async modu); sonuç (content, err)
+_fetch_cache = {}
+_fetch_lock = threading.Lock()
 
 def fetch_stream_url(stream):
-    stream_id = stream["id"]
-    slug = stream["slug"]
+    stream_id = stream.id
 
-    url = f"{ENDPOINT}/?ID={stream_id}"
-    print(f"  Fetching: {url}")
+    with _fetch_lock:
+        future = _fetch_cache.get(stream_id)
+        owner = future is None
+        if owner:
+            future = _fetch_cache[stream_id] = Future()
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        "Accept": "text/plain, */*"
-    }
+    if not owner:
+        log(f"  ↺ Reusing result of ID {stream_id} for {stream.slug}")
+        return future.result()
+
+    future.set_result(_fetch_by_id(stream_id, stream.slug))
+    return future.result()
+
+def _fetch_by_id(stream_id, slug):
+    url = f"{ENDPOINT}/?ID={stream_id}"
+    log(f"  Fetching: {url}")
 
     try:
-        resp = make_request(url, headers)
-        
-        if resp.status_code >= 500:
-            return None, f"ServerError_{resp.status_code}"
-
-        resp.raise_for_status()
-        
-        # URL'yi temizle: Sadece ilk satırı al ve boşlukları at
-        raw_output = resp.text.strip().split('\n')[0].replace('\r', '')
-
-        if "googlevideo.com" in raw_output or raw_output.startswith("http"):
-            print(f"  ✓ URL extracted for {slug}")
-            # M3U8 formatında sarmala
-            m3u8_content = (
-                "#EXTM3U\n"
-                "#EXT-X-VERSION:3\n"
-                "#EXT-X-STREAM-INF:BANDWIDTH=1280000,RESOLUTION=1280x720\n"
-                f"{raw_output}\n"
-            )
-            return m3u8_content, None
-        else:
-            print(f"  ✗ Invalid URL format for {slug}")
-            return None, "InvalidFormat"
+        for attempt in range(NOT_FOUND_RETRIES):
+            resp = make_request(url, HEADERS, stream=STREAM_BODY)
+            if resp.status_code != 404 or attempt == NOT_FOUND_RETRIES - 1:
+                break
+            resp.close()
+            time.sleep(NOT_FOUND_BACKOFF * (2 ** attempt))
 
+        # Worker yalnızca ilk satırdaki URL için çağrılıyor; gövdenin geri kalanı
+        # okunmadan, hata yanıtlarının (ör. HTML hata sayfaları) gövdesi hiç
+        # okunmadan bağlantı kapatılır
+        try:
+            buf = b""
+            if resp.status_code < 400:
+                chunks = resp.iter_content(CHUNK_SIZE) if STREAM_BODY else (resp.content,)
+                for chunk in chunks:
+                    buf, done = first_line_buffer(buf, chunk)
+                    if done:
+                        break
+        finally:
+            resp.close()
+        return extract_m3u8(slug, resp.status_code, buf)
     except Exception as e:
-        print(f"  ✗ Error for {slug}: {str(e)}")
+        log(f"  ✗ Error for {slug}: {str(e)}")
         return None, "RequestError"
 
-def save_stream(stream, content):
-    slug = stream["slug"]
-    sub = stream.get("subfolder", "")
+def create_async_client():
+    # HTTP/2 anlaşılırsa istekler tek bağlantıda çoğullanır; HTTP/1.1'e
+    # düşülürse havuz yine de eşzamanlılık kadar bağlantı açabilir
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=CONCURRENCY,
+            max_keepalive_connections=CONCURRENCY
+        ),
+        timeout=TIMEOUT,
+        follow_redirects=True
+    )
+
+async def fetch_stream_url_async(stream, http):
+    stream_id = stream.id
+
+    task = _fetch_cache.get(stream_id)
+    if task is None:
+        task = _fetch_cache[stream_id] = asyncio.ensure_future(
+            _fetch_by_id_async(stream_id, stream.slug, http)
+        )
+    else:
+        log(f"  ↺ Reusing result of ID {stream_id} for {stream.slug}")
+    return await task
+
+async def _fetch_by_id_async(stream_id, slug, http):
+    url = f"{ENDPOINT}/?ID={stream_id}"
+    log(f"  Fetching: {url}")
+
+    try:
+        for attempt in range(NOT_FOUND_RETRIES):
+            async with http.stream("GET", url, headers=HEADERS) as resp:
+                if resp.status_code != 404 or attempt == NOT_FOUND_RETRIES - 1:
+                    buf = b""
+                    if resp.status_code < 400:
+                        async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                            buf, done = first_line_buffer(buf, chunk)
+                            if done:
+                                break
+                    return extract_m3u8(slug, resp.status_code, buf)
+            await asyncio.sleep(NOT_FOUND_BACKOFF * (2 ** attempt))
+    except Exception as e:
+        log(f"  ✗ Error for {slug}: {str(e)}")
+        return None, "RequestError"
+
+def extract_m3u8(slug, status_code, buf):
+    if status_code >= 500:
+        return None, f"ServerError_{status_code}"
+
+    if status_code >= 400:
+        log(f"  ✗ Error for {slug}: HTTP {status_code}")
+        return None, "RequestError"
+
+    # URL'yi temizle: Sadece ilk satırı al ve boşlukları at.
+    # Kontrol ve sarmalama ham bayt üzerinde yapılır, decode/encode gerekmez
+    line = buf.strip().split(b"\n", 1)[0].replace(b"\r", b"")
 
-    outdir = Path(FOLDER_NAME) / sub
-    outdir.mkdir(parents=True, exist_ok=True)
+    if line.startswith(b"http") or b"googlevideo.com" in line:
+        log(f"  ✓ URL extracted for {slug}")
+        # M3U8 formatında sarmala (bayt olarak; dosyaya olduğu gibi yazılır)
+        return M3U8_HEADER + line + b"\n", None
+    else:
+        log(f"  ✗ Invalid URL format for {slug}")
+        return None, "InvalidFormat"
+
+# Bu çalıştırmada oluşturulmuş klasörler (her yayın için tekrar mkdir yapılmasın)
+_mkdir_cache = set()
+
+def ensure_dir(path):
+    if path not in _mkdir_cache:
+        path.mkdir(parents=True, exist_ok=True)
+        _mkdir_cache.add(path)
+
+def save_stream(stream, content):
+    outdir = Path(FOLDER_NAME) / stream.subfolder
+    ensure_dir(outdir)
 
-    outfile = outdir / f"{slug}.m3u8"
+    outfile = outdir / f"{stream.slug}.m3u8"
 
     try:
-        with open(outfile, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"  ✓ Saved: {outfile}")
+        # İçerik değişmediyse dosyaya dokunma (gereksiz yazma ve git diff olmasın)
+        if outfile.is_file() and outfile.stat().st_size == len(content) \
+                and outfile.read_bytes() == content:
+            log(f"  = Unchanged: {outfile}")
+            return True
+
+        outfile.write_bytes(content)
+        log(f"  ✓ Saved: {outfile}")
         return True
     except Exception as e:
-        print(f"  ✗ Cannot save {outfile}: {e}")
+        log(f"  ✗ Cannot save {outfile}: {e}")
         return False
 
 def delete_old(stream):
-    slug = stream["slug"]
-    sub = stream.get("subfolder", "")
-    path = Path(FOLDER_NAME) / sub / f"{slug}.m3u8"
+    path = Path(FOLDER_NAME) / stream.subfolder / f"{stream.slug}.m3u8"
     if path.exists():
         path.unlink()
-        print(f"  ⚠ Deleted broken/old: {path}")
+        log(f"  ⚠ Deleted broken/old: {path}")
+
+def handle_result(stream, content):
+    if content:
+        return save_stream(stream, content)
+    delete_old(stream)
+    return False
+
+def run_config_threaded(streams, ex):
+    total = len(streams)
+
+    def process(i, stream):
+        with stream_log():
+            log(f"\n[{i}/{total}] {stream.slug}")
+            content, err = fetch_stream_url(stream)
+            return handle_result(stream, content)
+
+    ok = fail = 0
+    futures = [ex.submit(process, i, s) for i, s in enumerate(streams, 1)]
+    for future in as_completed(futures):
+        if future.result():
+            ok += 1
+        else:
+            fail += 1
+    return ok, fail
+
+def run_threaded(configs):
+    # Havuz tüm çalıştırma boyunca tek; worker thread'ler (ve curl_cffi
+    # session'ları) config'ler arasında yeniden kullanılır
+    total_ok = total_fail = 0
+    try:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as ex:
+            for cfg, streams in configs:
+                print(f"\n📄 Processing: {cfg}")
+                ok, fail = run_config_threaded(streams, ex)
+                total_ok += ok
+                total_fail += fail
+    finally:
+        close_sessions()
+    return total_ok, total_fail
+
+async def run_config_async(streams, http, sem):
+    total = len(streams)
+
+    async def process(i, stream):
+        # Task'ın context'i to_thread ve fetch task'ına kopyalandığı için
+        # onların log satırları da bu yayının tamponuna düşer
+        with stream_log():
+            async with sem:
+                log(f"\n[{i}/{total}] {stream.slug}")
+                content, err = await fetch_stream_url_async(stream, http)
+            return await asyncio.to_thread(handle_result, stream, content)
+
+    results = await asyncio.gather(
+        *(process(i, s) for i, s in enumerate(streams, 1))
+    )
+
+    ok = sum(1 for r in results if r)
+    return ok, total - ok
+
+async def run_async(configs):
+    # Tüm config'ler tek event loop'ta işlenir: HTTP/2 bağlantısı, disk havuzu
+    # ve _fetch_cache'teki task'lar çalıştırma boyunca aynı loop'a aittir
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    # Disk yazma/silme işlemleri event loop'u bloklamasın diye thread havuzunda yapılır
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=DISK_WORKERS)
+    )
+
+    total_ok = total_fail = 0
+    async with create_async_client() as http:
+        for cfg, streams in configs:
+            print(f"\n📄 Processing: {cfg}")
+            ok, fail = await run_config_async(streams, http, sem)
+            total_ok += ok
+            total_fail += fail
+    return total_ok, total_fail
 
 def main():
     # HATANIN ÇÖZÜMÜ: global bildirimi fonksiyonun EN BAŞINDA olmalı
-    global FOLDER_NAME
+    global FOLDER_NAME, CONCURRENCY, session
 
     parser = argparse.ArgumentParser()
     parser.add_argument("config_files", nargs="+")
     parser.add_argument("--folder", default=FOLDER_NAME)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
     args = parser.parse_args()
 
     # Kullanıcıdan gelen folder bilgisini global değişkene ata
     FOLDER_NAME = args.folder
+    CONCURRENCY = max(1, args.concurrency)
+    if ASYNC_TYPE is None and SESSION_TYPE == "requests":
+        session = create_session(CONCURRENCY)
 
     print(f"--- YouTube Stream Updater ---")
-    print(f"✓ Session Provider: {SESSION_TYPE}")
+    print(f"✓ Session Provider: {ASYNC_TYPE or SESSION_TYPE}")
     print(f"✓ Output Directory: {FOLDER_NAME}")
+    if ASYNC_TYPE is None and SESSION_TYPE == "curl_cffi":
+        print(f"✓ Impersonate: {IMPERSONATE or 'off'}")
 
-    total_ok = 0
-    total_fail = 0
-
+    configs = []
     for cfg in args.config_files:
         if not os.path.exists(cfg):
             print(f"⚠ Config not found: {cfg}")
             continue
-        
-        streams = load_config(cfg)
-        print(f"\n📄 Processing: {cfg}")
+        configs.append((cfg, load_config(cfg)))
 
-        for i, stream in enumerate(streams, 1):
-            slug = stream['slug']
-            print(f"\n[{i}/{len(streams)}] {slug}")
-
-            content, err = fetch_stream_url(stream)
-
-            if content:
-                if save_stream(stream, content):
-                    total_ok += 1
-                else:
-                    total_fail += 1
-            else:
-                delete_old(stream)
-                total_fail += 1
+    if ASYNC_TYPE:
+        total_ok, total_fail = asyncio.run(run_async(configs))
+    else:
+        total_ok, total_fail = run_threaded(configs)
 
     print("\n" + "="*30)
     print(f"DONE: {total_ok} Success / {total_fail} Fail")